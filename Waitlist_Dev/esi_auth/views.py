@@ -1,10 +1,11 @@
-from django.shortcuts import redirect, resolve_url
+from django.http import HttpResponseRedirect
 # --- Import the tools we need ---
 from django.contrib.auth import logout, login
 # Import the built-in User model
 from django.contrib.auth.models import User
 # Import your EveCharacter model
 from waitlist.models import EveCharacter
+from waitlist.url_cache import cached_reverse
 from django.conf import settings
 from urllib.parse import urlencode
 import secrets 
@@ -12,19 +13,14 @@ from datetime import timezone, timedelta # Import for time calculations
 # Import the CallbackRedirect model from the esi library
 from esi.models import CallbackRedirect, Token
 # --- Import ESI client ---
-from esi.clients import EsiClientProvider
-from bravado.exception import HTTPNotFound
+from waitlist.helpers import get_esi, get_character_public_data, PUBLIC_DATA_FIELDS
 # --- Import logging ---
 import logging
 # Get a logger for this specific Python file
 logger = logging.getLogger(__name__)
 
-try:
-    # Import the real callback view from the esi library
-    from esi.views import receive_callback as esi_callback
-except ImportError:
-    # Fallback for different library versions
-    from esi.views import receive_callback as esi_callback
+# Import the real callback view from the esi library
+from esi.views import receive_callback as esi_callback
 
 def esi_login(request):
     """
@@ -40,7 +36,7 @@ def esi_login(request):
     state = secrets.token_urlsafe(16)
     
     # 3. Define where the user should land *after* the ESI callback.
-    redirect_url = resolve_url('esi_auth:sso_complete') 
+    redirect_url = cached_reverse('esi_auth:sso_complete')
 
     # 4. Create or Update the CallbackRedirect object
     callback, created = CallbackRedirect.objects.update_or_create(
@@ -78,7 +74,7 @@ def esi_login(request):
     
     # 6. Redirect the user to EVE's login page
     logger.info(f"Redirecting session {request.session.session_key} to EVE SSO")
-    return redirect(f"{authorize_url}?{urlencode(params)}")
+    return HttpResponseRedirect(f"{authorize_url}?{urlencode(params)}")
 
 # This is our "Step 3" view
 def sso_complete_login(request):
@@ -94,7 +90,7 @@ def sso_complete_login(request):
         )
     except CallbackRedirect.DoesNotExist:
         logger.warning(f"SSO Step 3: No CallbackRedirect found for session {request.session.session_key}")
-        return redirect('waitlist:home')
+        return HttpResponseRedirect(cached_reverse('waitlist:home'))
 
     # 2. Get the ESI token from the object.
     esi_token = callback_redirect.token
@@ -102,7 +98,7 @@ def sso_complete_login(request):
         # Callback happened but didn't result in a token.
         callback_redirect.delete() # Clean up the failed redirect
         logger.warning(f"SSO Step 3: CallbackRedirect found but has no token. Deleting.")
-        return redirect('waitlist:home')
+        return HttpResponseRedirect(cached_reverse('waitlist:home'))
         
     # 3. Prune old tokens for this character to prevent duplicates.
     logger.debug(f"SSO Step 3: Pruning old tokens for char {esi_token.character_id}")
@@ -117,55 +113,25 @@ def sso_complete_login(request):
     except AttributeError:
         logger.error(f"SSO Step 3: ESI token object is missing character_id or character_name fields. Token PK: {esi_token.pk}")
         callback_redirect.delete()
-        return redirect('waitlist:home')
+        return HttpResponseRedirect(cached_reverse('waitlist:home'))
         
     if not char_id or not char_name:
         # Token is missing key info
         logger.error(f"SSO Step 3: ESI token has null char_id or char_name. Token PK: {esi_token.pk}")
         callback_redirect.delete()
-        return redirect('waitlist:home')
+        return HttpResponseRedirect(cached_reverse('waitlist:home'))
 
     # 5. Handle 'Add Alt' vs 'First Login'
     user_account = None 
     user_was_authenticated = request.user.is_authenticated
     
-    esi = EsiClientProvider()
+    esi = get_esi()
     
     # Helper function to get public corp/alliance data
     def get_public_character_data(character_id):
         try:
             logger.debug(f"SSO Step 3: Getting public data for char {character_id}")
-            public_data = esi.client.Character.get_characters_character_id(
-                character_id=character_id
-            ).results()
-            
-            corp_id = public_data.get('corporation_id')
-            alliance_id = public_data.get('alliance_id')
-            
-            corp_name = None
-            if corp_id:
-                corp_data = esi.client.Corporation.get_corporations_corporation_id(
-                    corporation_id=corp_id
-                ).results()
-                corp_name = corp_data.get('name')
-                
-            alliance_name = None
-            if alliance_id:
-                try:
-                    alliance_data = esi.client.Alliance.get_alliances_alliance_id(
-                        alliance_id=alliance_id
-                    ).results()
-                    alliance_name = alliance_data.get('name')
-                except HTTPNotFound:
-                    logger.warning(f"SSO Step 3: Could not find alliance {alliance_id} (dead alliance?)")
-                    alliance_name = "N/A" # Handle dead alliances
-
-            return {
-                "corporation_id": corp_id,
-                "corporation_name": corp_name,
-                "alliance_id": alliance_id,
-                "alliance_name": alliance_name,
-            }
+            return get_character_public_data(esi, character_id)
         except Exception as e:
             logger.error(f"Error fetching public data for {character_id}: {e}", exc_info=True)
             return {} # Return empty dict on failure
@@ -240,17 +206,16 @@ def sso_complete_login(request):
         eve_char.refresh_token = esi_token.refresh_token
         eve_char.token_expiry = expiry_time
         
-        eve_char.corporation_id = public_data.get('corporation_id')
-        eve_char.corporation_name = public_data.get('corporation_name')
-        eve_char.alliance_id = public_data.get('alliance_id')
-        eve_char.alliance_name = public_data.get('alliance_name')
+        for field in PUBLIC_DATA_FIELDS:
+            setattr(eve_char, field, public_data.get(field))
         
         # This handles re-linking a character to a different account if needed
-        if eve_char.user != user_account:
+        # (compare IDs so the common case doesn't load the old user)
+        if eve_char.user_id != user_account.pk:
             logger.warning(f"SSO Step 3: Re-linking char {char_id} from user {eve_char.user.username} to {user_account.username}")
             eve_char.user = user_account
         
-        eve_char.save()
+        eve_char.save(update_fields=['access_token', 'refresh_token', 'token_expiry', 'user', *PUBLIC_DATA_FIELDS])
         
     elif char_created and not is_first_char:
         # This was a new character, but if the token has expired
@@ -264,7 +229,7 @@ def sso_complete_login(request):
         eve_char.access_token = esi_token.access_token
         eve_char.refresh_token = esi_token.refresh_token
         eve_char.token_expiry = expiry_time # Use our calculated time
-        eve_char.save()
+        eve_char.save(update_fields=['is_main', 'access_token', 'refresh_token', 'token_expiry'])
 
     # 8. We have the user object in memory, so we can
     #    now safely delete the redirect object.
@@ -289,7 +254,7 @@ def sso_complete_login(request):
     
     # 10. Send the now-logged-in user to the homepage.
     logger.info(f"SSO Step 3: Login complete for {char_name}, redirecting to home")
-    return redirect('waitlist:home')
+    return HttpResponseRedirect(cached_reverse('waitlist:home'))
 
 
 def esi_logout(request):
@@ -298,4 +263,4 @@ def esi_logout(request):
     """
     logger.info(f"User {request.user.username} logging out")
     logout(request)
-    return redirect('waitlist:home')
\ No newline at end of file
+    return HttpResponseRedirect(cached_reverse('waitlist:home'))
\ No newline at end of file
@@ -20,6 +20,11 @@ django.setup()
 # This must be called *after* django.setup()
 django_asgi_app = get_asgi_application()
 
+# --- Warm lazy caches at worker start ---
+from eve_waitlist.warmup import warm_caches
+
+warm_caches()
+
 # This router wraps the main Django app
 # It adds session/auth data to all HTTP requests,
 # which django-eventstream needs to work correctly.
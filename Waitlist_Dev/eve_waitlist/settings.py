@@ -195,6 +195,15 @@ ESI_SSO_SCOPES_FC = [
 ]
 # Our esi_login view will now choose one of the two lists above.
 
+# django-esi retries 502/503/504 responses itself, sleeping
+# BACKOFF_FACTOR * 2**(n-1) seconds before retry n (0.5s, 1s, 2s here).
+# This is the only retry layer for ESI server errors, don't add another.
+ESI_SERVER_ERROR_MAX_RETRIES = 3
+ESI_SERVER_ERROR_BACKOFF_FACTOR = 0.5
+# Room for the concurrent SDE fetches (waitlist.helpers.ESI_FETCH_WORKERS)
+# plus a few page requests, so they reuse warm TLS connections
+ESI_CONNECTION_POOL_MAXSIZE = 20
+
 # --- LOGGING CONFIGURATION
 LOGGING = {
     'version': 1,
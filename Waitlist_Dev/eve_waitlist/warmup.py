@@ -0,0 +1,18 @@
+"""
+Start-up warm-up shared by asgi.py and wsgi.py.
+"""
+
+from django.apps import apps
+from django.urls import get_resolver
+
+
+def warm_caches():
+    """
+    Fills Django's lazy per-process caches at worker start.
+    The URL resolver builds its reverse/namespace dicts on first use,
+    so without this the first request on each worker pays for it.
+    Call only after django.setup().
+    """
+    # Same call reverse()/reverse_dict make on first use
+    get_resolver()._populate()
+    apps.get_models()
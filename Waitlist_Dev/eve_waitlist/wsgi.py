@@ -19,4 +19,9 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'eve_waitlist.settings')
 
-application = get_wsgi_application()
\ No newline at end of file
+application = get_wsgi_application()
+
+# Same warm-up as asgi.py
+from eve_waitlist.warmup import warm_caches
+
+warm_caches()
\ No newline at end of file
@@ -4,10 +4,12 @@ from waitlist.models import (
     FitSubstitutionGroup, FleetWing, FleetSquad,
     EveDogmaAttribute, ItemComparisonRule, EveTypeDogmaAttribute
 )
-from pilot.models import EveType, EveGroup
+from pilot.models import EveType
 from django import forms
+from django.db.models import Count, Q
 from django.core.exceptions import ValidationError
 from waitlist.fit_parser import parse_eft_to_full_doctrine_data
+from django_eventstream import send_event
 import json
 import logging # <-- Add logging import
 
@@ -23,6 +25,7 @@ class EveCharacterAdmin(admin.ModelAdmin):
     Admin view for EVE Characters.
     """
     list_display = ('character_name', 'character_id', 'user')
+    list_select_related = ('user',)
     search_fields = ('character_name', 'user__username')
 
 @admin.register(ShipFit)
@@ -33,6 +36,8 @@ class ShipFitAdmin(admin.ModelAdmin):
     """
     list_display = ('character', 'ship_name', 'status', 'category', 'submitted_at', 'waitlist')
     list_filter = ('status', 'category', 'submitted_at', 'waitlist')
+    # Avoid one query per row for the character / waitlist columns
+    list_select_related = ('character', 'waitlist', 'waitlist__fleet')
     search_fields = ('character__character_name', 'ship_name')
     
     # Make status and denial_reason editable from the list view
@@ -67,18 +72,38 @@ class ShipFitAdmin(admin.ModelAdmin):
 
     def get_fit_summary(self, obj):
         """Returns the first line of the raw_fit, usually the ship name."""
-        try:
-            return obj.raw_fit.splitlines()[0]
-        except (IndexError, AttributeError):
-            return "Empty Fit"
+        # partition() stops at the first newline instead of splitting every line
+        first_line = (obj.raw_fit or '').partition('\n')[0].rstrip('\r')
+        return first_line or "Empty Fit"
     get_fit_summary.short_description = "Fit Summary"
 
+    # Rows per UPDATE, keeps MySQL row-lock hold time bounded
+    STATUS_UPDATE_CHUNK_SIZE = 500
+
+    def _update_status_in_chunks(self, queryset, action, **fields):
+        """
+        Applies 'fields' to the selected fits in chunks of primary keys,
+        sending one 'waitlist-updates' event per chunk.
+        """
+        pks = list(queryset.values_list('pk', flat=True))
+        size = self.STATUS_UPDATE_CHUNK_SIZE
+        updated = 0
+        for i in range(0, len(pks), size):
+            chunk = pks[i:i + size]
+            updated += ShipFit.objects.filter(pk__in=chunk).update(**fields)
+            send_event('waitlist-updates', 'update', {
+                'fit_ids': chunk,
+                'action': action
+            })
+        logger.info(f"Admin bulk {action}: updated {updated} fits")
+        return updated
+
     def approve_fits(self, request, queryset):
-        queryset.update(status='APPROVED', denial_reason=None)
+        self._update_status_in_chunks(queryset, 'approve', status='APPROVED', denial_reason=None)
     approve_fits.short_description = "Approve selected fits"
 
     def deny_fits(self, request, queryset):
-        queryset.update(status='DENIED', denial_reason="Fit does not meet doctrine.")
+        self._update_status_in_chunks(queryset, 'deny', status='DENIED', denial_reason="Fit does not meet doctrine.")
     deny_fits.short_description = "Deny selected fits (default reason)"
 
 @admin.register(Fleet)
@@ -87,6 +112,7 @@ class FleetAdmin(admin.ModelAdmin):
     Admin view for managing active Fleets.
     """
     list_display = ('description', 'fleet_commander', 'esi_fleet_id', 'is_active')
+    list_select_related = ('fleet_commander',)
     list_filter = ('is_active',)
     search_fields = ('description', 'fleet_commander__character_name')
 
@@ -96,11 +122,20 @@ class FleetWaitlistAdmin(admin.ModelAdmin):
     Admin view for managing Fleet Waitlists.
     """
     list_display = ('fleet', 'is_open', 'get_approved_count')
+    list_select_related = ('fleet', 'fleet__fleet_commander')
     list_filter = ('is_open',)
 
+    def get_queryset(self, request):
+        # Count approved fits in the changelist query itself
+        # instead of one COUNT(*) per row.
+        return super().get_queryset(request).annotate(
+            _approved_count=Count('all_fits', filter=Q(all_fits__status='APPROVED'))
+        )
+
     def get_approved_count(self, obj):
-        return obj.all_fits.filter(status='APPROVED').count()
+        return obj._approved_count
     get_approved_count.short_description = "Approved Fits"
+    get_approved_count.admin_order_field = '_approved_count'
 
 class DoctrineFitForm(forms.ModelForm):
     """
@@ -203,11 +238,10 @@ class FitSubstitutionGroupAdmin(admin.ModelAdmin):
     list_display = ('name', 'base_item')
     search_fields = ('name', 'base_item__name')
     
-    # Use autocomplete fields for easy selection
+    # Use autocomplete fields for easy selection.
+    # (No filter_horizontal: 'substitutes' points at the whole EveType
+    # table, and autocomplete already takes precedence for this field.)
     autocomplete_fields = ('base_item', 'substitutes')
-    
-    # Use a filter horizontal for a nice M2M interface
-    filter_horizontal = ('substitutes',)
 
 # Register Fleet Structure Models
 class FleetSquadInline(admin.TabularInline):
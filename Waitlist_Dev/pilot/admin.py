@@ -24,9 +24,10 @@ class EveTypeAdmin(admin.ModelAdmin):
 # Register the snapshot to view in admin
 @admin.register(PilotSnapshot)
 class PilotSnapshotAdmin(admin.ModelAdmin):
-    list_display = ('character', 'last_updated', 'get_total_sp')
+    list_display = ('character', 'last_updated', 'total_sp')
+    list_select_related = ('character',)
     search_fields = ('character__character_name',)
-    readonly_fields = ('character', 'skills_json', 'implants_json', 'last_updated')
+    readonly_fields = ('character', 'skills_json', 'implants_json', 'total_sp', 'last_updated')
 
     def has_add_permission(self, request):
         return False
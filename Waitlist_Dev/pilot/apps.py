@@ -1,6 +1,42 @@
+from contextlib import contextmanager
+
 from django.apps import AppConfig
 
 
+def _evetype_cache_receivers():
+    """Yields (signal, sender, dispatch_uid) for each EveType cache receiver."""
+    from django.db.models.signals import post_save, post_delete
+    from .models import EveType, EveGroup
+    for model in (EveType, EveGroup):
+        yield post_save, model, f'clear_evetype_cache_save_{model.__name__}'
+        yield post_delete, model, f'clear_evetype_cache_delete_{model.__name__}'
+
+
+def _connect_evetype_cache_receivers():
+    from .models import EveType
+    for signal, model, uid in _evetype_cache_receivers():
+        signal.connect(EveType.clear_cache, sender=model, dispatch_uid=uid)
+
+
 class PilotConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'pilot'
\ No newline at end of file
+    name = 'pilot'
+
+    def ready(self):
+        # Keep the in-process EveType cache in sync with SDE edits
+        _connect_evetype_cache_receivers()
+
+
+@contextmanager
+def evetype_cache_signals_muted():
+    """
+    Disconnects the EveType cache receivers during a bulk SDE rewrite.
+    While a post_delete receiver is attached, QuerySet.delete() has to
+    load and signal every row, so callers clear the cache once themselves.
+    """
+    for signal, model, uid in _evetype_cache_receivers():
+        signal.disconnect(sender=model, dispatch_uid=uid)
+    try:
+        yield
+    finally:
+        _connect_evetype_cache_receivers()
@@ -0,0 +1,30 @@
+# Generated by Django 5.0 on 2026-10-15 23:01
+
+import orjson
+from django.db import migrations, models
+
+
+def backfill_total_sp(apps, schema_editor):
+    PilotSnapshot = apps.get_model('pilot', 'PilotSnapshot')
+    for snapshot in PilotSnapshot.objects.exclude(skills_json__isnull=True).exclude(skills_json='').iterator():
+        try:
+            total_sp = (orjson.loads(snapshot.skills_json) or {}).get('total_sp', 0) or 0
+        except (orjson.JSONDecodeError, AttributeError):
+            continue
+        PilotSnapshot.objects.filter(pk=snapshot.pk).update(total_sp=total_sp)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pilot', '0010_evegroup_ignore_for_rules'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pilotsnapshot',
+            name='total_sp',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_total_sp, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,11 @@
-from django.db import models
-import json
+from django.db import models, DatabaseError
+from django.core.cache import cache as shared_cache
+from django.utils.functional import cached_property
+import orjson
+import logging
+import time
+
+logger = logging.getLogger(__name__)
 
 # From SDE: invCategories.csv
 class EveCategory(models.Model):
@@ -88,6 +94,102 @@ class EveType(models.Model):
         help_text="Item meta level (Dogma Attr 633)"
     )
 
+    # --- In-process SDE cache ---
+    # SDE rows are static between imports, so lookups by type_id
+    # are memoized per worker process. Rows are loaded on first use
+    # (with their group) rather than preloading the whole table.
+    # Misses fall through to the shared Django cache (so a fresh
+    # worker doesn't re-query what another one already loaded),
+    # then to the DB.
+    # Cleared by post_save/post_delete signals (see PilotConfig.ready).
+    _cache = {}
+    # Bumped on clear_cache(). Each worker compares it with the
+    # generation its _cache was filled under (at most every
+    # _LOCAL_CHECK_INTERVAL seconds) and drops the dict on a mismatch.
+    # That only reaches other processes with a shared CACHES backend;
+    # with the default per-process LocMemCache, the local TTL plus the
+    # shared timeout below (two hours) bound how long other workers keep
+    # serving rows from before an SDE import.
+    _SHARED_CACHE_GENERATION_KEY = 'evetype:generation'
+    _cache_generation = None
+    _cache_checked_at = 0.0 # time.monotonic() of the last generation check
+    _cache_filled_at = 0.0
+    _LOCAL_CHECK_INTERVAL = 60
+    _LOCAL_CACHE_TTL = 60 * 60
+    _SHARED_CACHE_TIMEOUT = _LOCAL_CACHE_TTL
+
+    @classmethod
+    def _get_local_cache(cls):
+        """
+        Returns (local dict, generation), starting a new dict if the
+        shared generation moved on or the current one is too old.
+        """
+        now = time.monotonic()
+        if now - cls._cache_checked_at >= cls._LOCAL_CHECK_INTERVAL:
+            generation = shared_cache.get_or_set(cls._SHARED_CACHE_GENERATION_KEY, 0, None)
+            if generation != cls._cache_generation or now - cls._cache_filled_at >= cls._LOCAL_CACHE_TTL:
+                # Swap rather than clear() so a concurrent reader
+                # keeps a consistent (if old) dict
+                cls._cache = {}
+                cls._cache_generation = generation
+                cls._cache_filled_at = now
+            cls._cache_checked_at = now
+        return cls._cache, cls._cache_generation
+
+    @classmethod
+    def get_cached(cls, type_id):
+        """Returns the EveType for type_id (with group loaded), or None."""
+        return cls.get_cached_bulk([type_id]).get(type_id)
+
+    @classmethod
+    def get_cached_bulk(cls, type_ids):
+        """
+        Returns a {type_id: EveType} dict for the given IDs.
+        IDs that are not in the database are left out.
+        """
+        local, generation = cls._get_local_cache()
+        if not isinstance(type_ids, (set, frozenset)):
+            type_ids = set(type_ids) # Duplicates would only repeat work below
+        missing = [tid for tid in type_ids if tid not in local]
+        if missing:
+            prefix = f"evetype:{generation}:"
+            shared_hits = shared_cache.get_many([f"{prefix}{tid}" for tid in missing])
+            local.update((t.type_id, t) for t in shared_hits.values())
+
+            missing = [tid for tid in missing if tid not in local]
+            if missing:
+                # description is by far the widest column and no
+                # cached caller reads it, so leave it out of the SELECT
+                try:
+                    loaded = {
+                        t.type_id: t
+                        for t in cls.objects.filter(type_id__in=missing).select_related('group').defer('description')
+                    }
+                except DatabaseError as e:
+                    # Serve what the caches have rather than failing the
+                    # whole page; callers already skip unknown types
+                    logger.warning(f"EveType lookup failed, serving {len(type_ids) - len(missing)} cached of {len(type_ids)}: {e}")
+                    loaded = {}
+                if loaded:
+                    local.update(loaded)
+                    shared_cache.set_many(
+                        {f"{prefix}{tid}": t for tid, t in loaded.items()},
+                        cls._SHARED_CACHE_TIMEOUT
+                    )
+        return {tid: local[tid] for tid in type_ids if tid in local}
+
+    @classmethod
+    def clear_cache(cls, **kwargs):
+        """Empties the in-process and shared caches. Also usable as a signal receiver."""
+        try:
+            shared_cache.incr(cls._SHARED_CACHE_GENERATION_KEY)
+        except ValueError:
+            # Key expired or was never set
+            shared_cache.set(cls._SHARED_CACHE_GENERATION_KEY, 1, None)
+        cls._cache = {}
+        # Re-read the generation on the next lookup
+        cls._cache_checked_at = 0.0
+
     def __str__(self):
         return self.name
 
@@ -111,38 +213,99 @@ class PilotSnapshot(models.Model):
     
     last_updated = models.DateTimeField(auto_now=True)
 
+    # Denormalized from skills_json on save() so list views and
+    # the admin don't have to decode the skills blob per row.
+    total_sp = models.BigIntegerField(default=0)
+
+    # Parsed JSON is memoized per instance so a single render
+    # doesn't decode the same (large) skills blob several times.
+    # Maps each cached property to the text field it is parsed from.
+    _PARSED_CACHE_KEYS = {'_skills_data': 'skills_json', '_implants_data': 'implants_json'}
+
+    def _parse_json_field(self, field, default):
+        raw = getattr(self, field)
+        # Remember the text we parsed so save() can tell if it changed
+        self.__dict__.setdefault('_parsed_from', {})[field] = raw
+        if not raw:
+            return default
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            return default
+
+    @cached_property
+    def _skills_data(self):
+        # The ESI response is a dict, e.g.:
+        # {"skills": [{"skill_id": 3339, "active_skill_level": 5}, ...], "total_sp": 150000000}
+        return self._parse_json_field('skills_json', {})
+
+    @cached_property
+    def _implants_data(self):
+        # The ESI response is just a list of type_ids, e.g., [33323, 22118]
+        return self._parse_json_field('implants_json', [])
+
+    def _clear_parsed_cache(self, only_stale=False):
+        parsed_from = self.__dict__.get('_parsed_from', {})
+        for key, field in self._PARSED_CACHE_KEYS.items():
+            if only_stale and key in self.__dict__ and parsed_from.get(field) == getattr(self, field):
+                continue
+            self.__dict__.pop(key, None)
+
+    def set_skills_data(self, data):
+        """Stores an ESI /skills/ response, keeping the parsed form."""
+        self.skills_json = orjson.dumps(data).decode()
+        self.__dict__['_skills_data'] = data
+        self.__dict__.setdefault('_parsed_from', {})['skills_json'] = self.skills_json
+
+    def set_implants_data(self, data):
+        """Stores an ESI /implants/ response, keeping the parsed form."""
+        self.implants_json = orjson.dumps(data).decode()
+        self.__dict__['_implants_data'] = data
+        self.__dict__.setdefault('_parsed_from', {})['implants_json'] = self.implants_json
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what was loaded so save() knows if skills changed
+        instance._loaded_skills_json = instance.__dict__.get('skills_json')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Keep parsed data that still matches its text (e.g. set via set_skills_data)
+        self._clear_parsed_cache(only_stale=True)
+        if self.skills_json != getattr(self, '_loaded_skills_json', None):
+            self.total_sp = self._skills_data.get('total_sp', 0) or 0
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'skills_json' in update_fields:
+                kwargs['update_fields'] = {*update_fields, 'total_sp'}
+        super().save(*args, **kwargs)
+        self._loaded_skills_json = self.skills_json
+
+    def refresh_from_db(self, *args, **kwargs):
+        self._clear_parsed_cache()
+        super().refresh_from_db(*args, **kwargs)
+        self._loaded_skills_json = self.skills_json
+
     def get_implant_ids(self):
         """Helper to get implant ID list from JSON."""
-        if not self.implants_json:
-            return []
-        try:
-            # The ESI response is just a list of type_ids, e.g., [33323, 22118]
-            implant_ids = json.loads(self.implants_json)
-            return implant_ids
-        except json.JSONDecodeError:
-            return []
+        implant_ids = self._implants_data
+        return implant_ids if isinstance(implant_ids, list) else []
 
     def get_skills(self):
         """Helper to get skill list from JSON."""
-        if not self.skills_json:
-            return []
-        try:
-            # The ESI response is a dict, e.g.:
-            # {"skills": [{"skill_id": 3339, "active_skill_level": 5}, ...], "total_sp": 150000000}
-            skills_data = json.loads(self.skills_json)
-            return skills_data.get('skills', [])
-        except json.JSONDecodeError:
-            return []
-            
+        return self._skills_data.get('skills', [])
+
     def get_total_sp(self):
-        """Helper to get total SP from JSON."""
-        if not self.skills_json:
-            return 0
-        try:
-            skills_data = json.loads(self.skills_json)
-            return skills_data.get('total_sp', 0)
-        except json.JSONDecodeError:
-            return 0
+        """Helper to get total SP (kept in sync with skills_json by save())."""
+        return self.total_sp
+
+    def get_skill_types(self):
+        """{type_id: EveType} for this snapshot's skills, in one lookup."""
+        return EveType.get_cached_bulk({s['skill_id'] for s in self.get_skills()})
+
+    def get_implant_types(self):
+        """{type_id: EveType} for this snapshot's implants, in one lookup."""
+        return EveType.get_cached_bulk(self.get_implant_ids())
 
     def __str__(self):
         return f"Snapshot for {self.character.character_name}"
\ No newline at end of file
@@ -1,31 +1,36 @@
-from django.shortcuts import render, get_object_or_404, redirect, resolve_url
+from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth import logout
 from django.utils import timezone
-from datetime import timedelta, datetime # --- Import datetime ---
-import json
+from datetime import timedelta, timezone as dt_timezone
+from email.utils import parsedate_to_datetime
+from collections import defaultdict
+import hashlib
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests # For handling HTTP errors during refresh
-from django.http import JsonResponse, HttpResponseBadRequest, HttpResponse
+from django.http import JsonResponse, HttpResponseBadRequest, HttpResponse, HttpResponseRedirect
 from django.template.loader import render_to_string
 from django.views.decorators.http import require_POST
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 
 from waitlist.models import EveCharacter
+from waitlist.url_cache import cached_reverse
+from waitlist.helpers import (
+    is_fleet_commander, get_header_characters, get_esi, ESI_FETCH_WORKERS,
+    get_character_public_data, PUBLIC_DATA_FIELDS, TOKEN_REFRESH_MARGIN,
+)
 from .models import PilotSnapshot, EveGroup, EveType, EveCategory
 
-from esi.clients import EsiClientProvider
 from esi.models import Token
-from bravado.exception import HTTPNotFound
 from django.db import transaction
+from django.core.cache import cache
 
 import logging
 logger = logging.getLogger(__name__)
 
 
-def is_fleet_commander(user):
-    """
-    Checks if a user is in the 'Fleet Commander' group.
-    """
-    return user.groups.filter(name='Fleet Commander').exists()
 
 
 # --- HELPER FUNCTION: GET AND REFRESH TOKEN ---
@@ -39,58 +44,17 @@ def get_refreshed_token_for_character(user, character):
         token = Token.objects.filter(
             user=user, 
             character_id=character.character_id
-        ).order_by('-created').first()
-        
-        if not token:
-            logger.warning(f"No ESI token found for character {character.character_id}")
-            raise Token.DoesNotExist
+        ).latest('created') # Raises Token.DoesNotExist if there is none
 
-        if not character.token_expiry or character.token_expiry < timezone.now():
+        if not character.token_expiry or character.token_expiry < timezone.now() + TOKEN_REFRESH_MARGIN:
             logger.info(f"Refreshing ESI token for {character.character_name} ({character.character_id})")
             token.refresh()
             character.access_token = token.access_token
             character.token_expiry = token.expires # .expires is added in-memory by .refresh()
-            
-            # Refresh public data on token refresh
-            esi = EsiClientProvider()
-            try:
-                logger.debug(f"Refreshing public data for {character.character_id}")
-                public_data = esi.client.Character.get_characters_character_id(
-                    character_id=character.character_id
-                ).results()
-                
-                corp_id = public_data.get('corporation_id')
-                alliance_id = public_data.get('alliance_id')
-                
-                corp_name = None
-                if corp_id:
-                    corp_data = esi.client.Corporation.get_corporations_corporation_id(
-                        corporation_id=corp_id
-                    ).results()
-                    corp_name = corp_data.get('name')
-                    
-                alliance_name = None
-                if alliance_id:
-                    try:
-                        alliance_data = esi.client.Alliance.get_alliances_alliance_id(
-                            alliance_id=alliance_id
-                        ).results()
-                        alliance_name = alliance_data.get('name')
-                    except HTTPNotFound:
-                        logger.warning(f"Could not find alliance {alliance_id} for char {character.character_id} (dead alliance?)")
-                        alliance_name = "N/A" # Handle dead alliances
-                
-                # Update character model
-                character.corporation_id = corp_id
-                character.corporation_name = corp_name
-                character.alliance_id = alliance_id
-                character.alliance_name = alliance_name
-                logger.debug(f"Public data refreshed for {character.character_id}")
-                
-            except Exception as e:
-                logger.error(f"Error refreshing public data for {character.character_id}: {e}", exc_info=True)
-            
-            character.save()
+
+            # Corp/alliance are refreshed with the snapshot (section=all),
+            # so the token refresh stays a single OAuth round-trip
+            character.save(update_fields=['access_token', 'token_expiry'])
             logger.info(f"Token refreshed successfully for {character.character_name}")
             
         return token
@@ -115,6 +79,103 @@ def get_refreshed_token_for_character(user, character):
 # --- END HELPER FUNCTION ---
 
 
+# --- Grouped skills cache ---
+# The grouping only depends on the snapshot and the (static) SDE tables,
+# so it is cached per snapshot version. A refresh bumps last_updated,
+# which changes the key, so stale entries just age out.
+GROUPED_SKILLS_CACHE_TTL = 60 * 60
+
+# Stale snapshots trigger at most one background refresh per pilot in this window
+PILOT_REFRESH_DEBOUNCE = 5 * 60
+
+# Upper bound on how long a refresh holds its single-flight lock,
+# in case the worker dies before releasing it
+PILOT_REFRESH_LOCK_TIMEOUT = 2 * 60
+
+# A section refreshed this recently is served from the DB unless ?force=1
+PILOT_SECTION_REFRESH_TTL = 60
+PILOT_REFRESH_SECTIONS = ('skills', 'implants', 'public')
+
+
+def _section_refreshed_key(character_id, section):
+    return f"pilot_section_refreshed:{character_id}:{section}"
+
+def _build_grouped_skills(snapshot):
+    """Returns {group_name: [{'name', 'level'}, ...]} sorted by group name."""
+    grouped_skills = defaultdict(list)
+    skills_list = snapshot.get_skills()
+    if skills_list:
+        cached_types = snapshot.get_skill_types()
+        
+        # We ONLY show skills we have cached. The refresh API
+        # will handle fetching any missing ones.
+        for skill in skills_list:
+            eve_type = cached_types.get(skill['skill_id'])
+            if eve_type is None:
+                continue
+            grouped_skills[eve_type.group.name].append({
+                'name': eve_type.name,
+                'level': skill['active_skill_level']
+            })
+    # Plain dict for the template: a defaultdict would shadow
+    # '.items' lookups with an empty list. Only the group names are
+    # sorted; this runs once per snapshot version (see _get_grouped_skills).
+    sorted_grouped_skills = {name: grouped_skills[name] for name in sorted(grouped_skills)}
+    logger.debug(f"Loaded {len(skills_list)} skills into {len(sorted_grouped_skills)} groups")
+    return sorted_grouped_skills
+
+
+def _get_grouped_skills(snapshot):
+    """Cached wrapper around _build_grouped_skills()."""
+    if snapshot.last_updated is None:
+        # Unsaved placeholder snapshot, nothing worth caching
+        return _build_grouped_skills(snapshot)
+    key = f"pilot_grouped_skills:{snapshot.character_id}:{snapshot.last_updated.timestamp()}"
+    grouped = cache.get(key)
+    if grouped is None:
+        grouped = _build_grouped_skills(snapshot)
+        cache.set(key, grouped, GROUPED_SKILLS_CACHE_TTL)
+    return grouped
+
+
+def _bucket_implants(implants):
+    """
+    Splits enriched implants into (other, slots 1-5, slots 6-10)
+    in one pass, each bucket ordered by slot.
+    """
+    implants_other = []
+    implants_col1 = [] # Slots 1-5
+    implants_col2 = [] # Slots 6-10
+    for implant in implants:
+        slot = implant.get('slot', 0)
+        if 0 < slot <= 5:
+            implants_col1.append(implant)
+        elif 5 < slot <= 10:
+            implants_col2.append(implant)
+        else:
+            implants_other.append(implant)
+    for bucket in (implants_other, implants_col1, implants_col2):
+        bucket.sort(key=itemgetter('slot'))
+    return implants_other, implants_col1, implants_col2
+
+
+def _pilot_detail_etag(request, character, snapshot, all_user_chars, is_fc):
+    """
+    Validator for a rendered pilot_detail page: changes whenever
+    anything the page (or base.html's header) shows could change.
+    """
+    user = request.user
+    parts = [
+        user.pk, user.is_staff, is_fc,
+        # The page embeds a CSRF token, which is tied to this secret
+        request.META.get('CSRF_COOKIE'),
+        snapshot.last_updated.isoformat(),
+        *(getattr(character, field) for field in PUBLIC_DATA_FIELDS),
+        *((c.character_id, c.character_name, c.is_main) for c in all_user_chars),
+    ]
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
 @login_required
 def pilot_detail(request, character_id):
     """
@@ -123,72 +184,77 @@ def pilot_detail(request, character_id):
     It passes a flag to the template if a refresh is needed.
     """
     
-    esi = EsiClientProvider()
     logger.debug(f"User {request.user.username} viewing pilot_detail for char {character_id}")
     character = get_object_or_404(EveCharacter, character_id=character_id, user=request.user)
     
-    # 1. Get and refresh token (this is fast)
-    token = get_refreshed_token_for_character(request.user, character)
-    if not token:
-        # Token was invalid, helper logged user out
-        logger.warning(f"Token refresh failed for {character.character_name}, logging user {request.user.username} out.")
-        logout(request)
-        return redirect('esi_auth:login')
-
-    # 2. Check scopes (fast)
-    required_scopes = ['esi-skills.read_skills.v1', 'esi-clones.read_implants.v1']
-    available_scopes = set(s.name for s in token.scopes.all())
-    has_all_scopes = all(scope in available_scopes for scope in required_scopes)
-    if not has_all_scopes:
-        missing = [s for s in required_scopes if s not in available_scopes]
-        logger.warning(f"User {request.user.username} missing scopes for {character.character_name}: {missing}. Redirecting to login.")
-        return redirect(f"{resolve_url('esi_auth:login')}?scopes=regular")
-
-    # 3. Get snapshot and check if it's stale
-    snapshot, created = PilotSnapshot.objects.get_or_create(character=character)
+    # 1. Get snapshot and check if it's stale. This view only reads, so a
+    #    missing row is not created here; api_refresh_pilot creates it.
+    snapshot = PilotSnapshot.objects.filter(character=character).first()
+    created = snapshot is None
+    if created:
+        snapshot = PilotSnapshot(character=character) # Unsaved, renders as empty
     
     needs_update = False
-    if created or snapshot.last_updated < (timezone.now() - timedelta(hours=1)):
-        logger.debug(f"Snapshot for {character.character_name} is stale or was just created.")
+    refresh_in_background = False
+    if created or not snapshot.skills_json or not snapshot.implants_json:
+        # Nothing to show yet, the page has to wait for the refresh
+        logger.debug(f"Snapshot for {character.character_name} was just created or is missing skill/implant data.")
         needs_update = True
-    if not snapshot.skills_json or not snapshot.implants_json:
-        logger.debug(f"Snapshot for {character.character_name} is missing skill/implant data.")
-        needs_update = True
-        
+    elif snapshot.last_updated < (timezone.now() - timedelta(hours=1)):
+        # Serve the stale data now and refresh behind it. cache.add() only
+        # succeeds for the first view in the window, so several open tabs
+        # don't all trigger an ESI refresh for the same pilot.
+        if cache.add(f"pilot_refresh:{character.character_id}", True, PILOT_REFRESH_DEBOUNCE):
+            logger.debug(f"Snapshot for {character.character_name} is stale, refreshing in background.")
+            needs_update = True
+            refresh_in_background = True
+
+    # A fresh snapshot renders straight from the DB, so the token
+    # and scope checks are only needed when the page has to wait for
+    # a refresh. A background refresh gets its token in api_refresh_pilot.
+    if needs_update and not refresh_in_background:
+        # 2. Get and refresh token (this is fast)
+        token = get_refreshed_token_for_character(request.user, character)
+        if not token:
+            # Token was invalid, helper logged user out
+            logger.warning(f"Token refresh failed for {character.character_name}, logging user {request.user.username} out.")
+            logout(request)
+            return HttpResponseRedirect(cached_reverse('esi_auth:login'))
+
+        # 3. Check scopes (fast)
+        required_scopes = {'esi-skills.read_skills.v1', 'esi-clones.read_implants.v1'}
+        # One query for just the required names; the difference is what's missing
+        granted_scopes = set(token.scopes.filter(name__in=required_scopes).values_list('name', flat=True))
+        if granted_scopes != required_scopes:
+            missing = sorted(required_scopes - granted_scopes)
+            logger.warning(f"User {request.user.username} missing scopes for {character.character_name}: {missing}. Redirecting to login.")
+            return HttpResponseRedirect(f"{cached_reverse('esi_auth:login')}?scopes=regular")
+
     # This view no longer runs the ESI update, it just sets the flag.
+
+    all_user_chars, main_char = get_header_characters(request)
+    is_fc = is_fleet_commander(request.user)
+
+    # Nothing on the page changed since the browser's copy: answer 304
+    # before any grouping or rendering. Pages that still have to
+    # trigger a refresh are always rendered.
+    etag = None
+    if not needs_update:
+        etag = _pilot_detail_etag(request, character, snapshot, all_user_chars, is_fc)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
             
     # SDE & GROUPING LOGIC (This is fast, it reads from our DB)
     logger.debug(f"Loading skills from snapshot for {character.character_name}")
-    grouped_skills = {}
-    skills_list = snapshot.get_skills()
-    if skills_list:
-        all_skill_ids = [s['skill_id'] for s in skills_list]
-        cached_types = {t.type_id: t for t in EveType.objects.filter(type_id__in=all_skill_ids).select_related('group')}
-        
-        # We ONLY show skills we have cached. The refresh API
-        # will handle fetching any missing ones.
-        for skill in skills_list:
-            skill_id = skill['skill_id']
-            if skill_id in cached_types:
-                eve_type = cached_types[skill_id]
-                group_name = eve_type.group.name
-                
-                if group_name not in grouped_skills:
-                    grouped_skills[group_name] = []
-                    
-                grouped_skills[group_name].append({
-                    'name': eve_type.name,
-                    'level': skill['active_skill_level']
-                })
-    sorted_grouped_skills = dict(sorted(grouped_skills.items()))
-    logger.debug(f"Loaded {len(skills_list)} skills into {len(sorted_grouped_skills)} groups")
+    sorted_grouped_skills = _get_grouped_skills(snapshot)
 
     # IMPLANT LOGIC (This is fast, it reads from our DB)
     logger.debug(f"Loading implants from snapshot for {character.character_name}")
     all_implant_ids = snapshot.get_implant_ids()
     enriched_implants = []
     if all_implant_ids:
-        cached_implant_types = {t.type_id: t for t in EveType.objects.filter(type_id__in=all_implant_ids).select_related('group')}
+        cached_implant_types = snapshot.get_implant_types()
         
         for implant_id in all_implant_ids:
             if implant_id in cached_implant_types:
@@ -198,30 +264,12 @@ def pilot_detail(request, character_id):
                     'name': eve_type.name,
                     'group_name': eve_type.group.name,
                     'slot': eve_type.slot if eve_type.slot else 0,
-                    'icon_url': f"https://images.evetech.net/types/{implant_id}/icon?size=64"
+                    # Icon URL is built from type_id in the template
                 })
     
-    sorted_implants = sorted(enriched_implants, key=lambda i: i.get('slot', 0))
-    
-    implants_other = []
-    implants_col1 = [] # Slots 1-5
-    implants_col2 = [] # Slots 6-10
-    for implant in sorted_implants:
-        slot = implant.get('slot', 0)
-        if 0 < slot <= 5:
-            implants_col1.append(implant)
-        elif 5 < slot <= 10:
-            implants_col2.append(implant)
-        else:
-            implants_other.append(implant)
+    implants_other, implants_col1, implants_col2 = _bucket_implants(enriched_implants)
     logger.debug(f"Loaded {len(enriched_implants)} implants")
 
-    # Context logic for Main/Alts
-    all_user_chars = request.user.eve_characters.all().order_by('character_name')
-    main_char = all_user_chars.filter(is_main=True).first()
-    if not main_char:
-        main_char = all_user_chars.first()
-
     context = {
         'character': character,
         'implants_other': implants_other,
@@ -232,18 +280,44 @@ def pilot_detail(request, character_id):
         'portrait_url': f"https://images.evetech.net/characters/{character.character_id}/portrait?size=256",
         'grouped_skills': sorted_grouped_skills,
         'needs_refresh': needs_update, # Pass the flag!
+        'refresh_in_background': refresh_in_background,
         
-        'is_fc': is_fleet_commander(request.user), # For base template
+        'is_fc': is_fc, # For base template
         'user_characters': all_user_chars, # For X-Up modal
         'all_chars_for_header': all_user_chars, # For header dropdown
         'main_char_for_header': main_char, # For header dropdown
     }
     
-    return render(request, 'pilot_detail.html', context)
+    response = render(request, 'pilot_detail.html', context)
+    if etag:
+        response.headers['ETag'] = quote_etag(etag)
+        # Per-user page: browsers may keep it, but must revalidate
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _fetch_concurrently(fetch, ids, label):
+    """
+    Calls fetch(id) for every id on a bounded thread pool.
+    Returns {id: result}. Failures are logged and left out,
+    so one bad ID doesn't sink the whole batch.
+    """
+    results = {}
+    if not ids:
+        return results
+    with ThreadPoolExecutor(max_workers=min(ESI_FETCH_WORKERS, len(ids))) as executor:
+        futures = {executor.submit(fetch, item_id): item_id for item_id in ids}
+        for future in as_completed(futures):
+            item_id = futures[future]
+            try:
+                results[item_id] = future.result()
+            except Exception as e:
+                logger.error(f"Failed to fetch {label} {item_id} from ESI: {e}", exc_info=True)
+    return results
 
 
 # --- NEW HELPER FUNCTION FOR SDE CACHING ---
-def _cache_missing_eve_types(type_ids_to_check: list):
+def _cache_missing_eve_types(type_ids_to_check: set):
     """
     Checks a list of type IDs against the local SDE (EveType table)
     and fetches any missing ones from ESI.
@@ -253,13 +327,12 @@ def _cache_missing_eve_types(type_ids_to_check: list):
 
     logger.debug(f"Checking/caching {len(type_ids_to_check)} EveType IDs...")
     
-    # Use set for efficient lookup
-    type_ids_set = set(type_ids_to_check)
+    # Callers pass a set; only coerce anything else
+    type_ids_set = type_ids_to_check if isinstance(type_ids_to_check, (set, frozenset)) else set(type_ids_to_check)
     
     # Find which types are already in our database
-    cached_type_ids = set(EveType.objects.filter(
-        type_id__in=type_ids_set
-    ).values_list('type_id', flat=True))
+    # (served from the in-process EveType cache once warm)
+    cached_type_ids = EveType.get_cached_bulk(type_ids_set).keys()
     
     # Determine which IDs are missing
     missing_ids = list(type_ids_set - cached_type_ids)
@@ -270,73 +343,114 @@ def _cache_missing_eve_types(type_ids_to_check: list):
 
     logger.info(f"Found {len(missing_ids)} missing EveTypes to cache from ESI.")
     
-    esi = EsiClientProvider()
+    esi = get_esi()
     
-    # Pre-fetch all groups from our DB to avoid multiple queries in the loop
-    cached_groups = {g.group_id: g for g in EveGroup.objects.all()}
+    # 1. Fetch all missing types from ESI in parallel
+    type_data_map = _fetch_concurrently(
+        lambda type_id: esi.client.Universe.get_universe_types_type_id(type_id=type_id).results(),
+        missing_ids,
+        'type'
+    )
     
-    for type_id in missing_ids:
-        try:
-            # 1. Fetch type data from ESI
-            type_data = esi.client.Universe.get_universe_types_type_id(type_id=type_id).results()
-            
-            # 2. Find or create its group
-            group_id = type_data['group_id']
-            group = cached_groups.get(group_id)
-            
-            if not group:
-                logger.debug(f"Caching new group {group_id} for type {type_id}")
-                group_data = esi.client.Universe.get_universe_groups_group_id(group_id=group_id).results()
-                category_id = group_data.get('category_id')
-                
-                # Try to get category from DB
-                category = None
-                if category_id:
-                    try:
-                        category = EveCategory.objects.get(category_id=category_id)
-                    except EveCategory.DoesNotExist:
-                        logger.warning(f"Could not find Category {category_id} for Group {group_id} while caching type {type_id}. This is fine if SDE is not fully imported.")
-                        pass # Category might not exist if SDE import hasn't run
-                
-                group = EveGroup.objects.create(
-                    group_id=group_id, 
-                    name=group_data['name'],
-                    category=category, # Link to category if found
-                    published=group_data.get('published', True)
-                )
-                cached_groups[group.group_id] = group # Add to our in-memory cache
-                logger.debug(f"Cached new group: {group.name}")
-
-            # 3. Get implant slot (Dogma Attr 300) if it exists
-            slot = None
-            if 'dogma_attributes' in type_data:
-                for attr in type_data['dogma_attributes']:
-                    if attr['attribute_id'] == 300: # 300 = implantSlot
-                        slot = int(attr['value'])
-                        break
-            
-            # 4. Create the new EveType in our database
-            EveType.objects.create(
-                type_id=type_id, 
-                name=type_data['name'], 
-                group=group, 
-                slot=slot, # Will be None if not an implant
-                published=type_data.get('published', True),
-                description=type_data.get('description'),
-                mass=type_data.get('mass'),
-                volume=type_data.get('volume'),
-                capacity=type_data.get('capacity'),
-                icon_id=type_data.get('icon_id'),
-            )
-            logger.debug(f"Cached new EveType: {type_data['name']} (ID: {type_id})")
-
-        except Exception as e:
-            logger.error(f"Failed to cache SDE for type_id {type_id}: {e}", exc_info=True)
-            continue # Skip this one type and continue the loop
+    # 2. Load only the groups these types reference, then
+    #    fetch the ones we have not seen yet, also in parallel
+    needed_group_ids = {td['group_id'] for td in type_data_map.values()}
+    cached_groups = EveGroup.objects.in_bulk(needed_group_ids)
+    missing_group_ids = needed_group_ids - cached_groups.keys()
+    group_data_map = _fetch_concurrently(
+        lambda group_id: esi.client.Universe.get_universe_groups_group_id(group_id=group_id).results(),
+        missing_group_ids,
+        'group'
+    )
+    
+    # Load the categories of all new groups in one query
+    cached_categories = EveCategory.objects.in_bulk(
+        {gd['category_id'] for gd in group_data_map.values() if gd.get('category_id')}
+    )
+    
+    new_groups = []
+    for group_id, group_data in group_data_map.items():
+        category_id = group_data.get('category_id')
+        category = cached_categories.get(category_id)
+        if category_id and not category:
+            # Category might not exist if SDE import hasn't run
+            logger.warning(f"Could not find Category {category_id} for Group {group_id}. This is fine if SDE is not fully imported.")
+        
+        new_groups.append(EveGroup(
+            group_id=group_id, 
+            name=group_data['name'],
+            category=category, # Link to category if found
+            published=group_data.get('published', True)
+        ))
+    
+    cached_groups.update((g.group_id, g) for g in new_groups)
+    
+    # 3. Build the new EveTypes
+    new_types = []
+    for type_id, type_data in type_data_map.items():
+        group_id = type_data['group_id']
+        if group_id not in cached_groups:
+            logger.warning(f"Skipping type_id {type_id}: group {group_id} could not be cached")
+            continue
+        
+        # Get implant slot (Dogma Attr 300 = implantSlot) if it exists
+        slot = next(
+            (int(attr['value']) for attr in type_data.get('dogma_attributes', ()) if attr['attribute_id'] == 300),
+            None
+        )
+        
+        new_types.append(EveType(
+            type_id=type_id, 
+            name=type_data['name'], 
+            group_id=group_id, # group_id is EveGroup's primary key
+            slot=slot, # Will be None if not an implant
+            published=type_data.get('published', True),
+            description=type_data.get('description'),
+            mass=type_data.get('mass'),
+            volume=type_data.get('volume'),
+            capacity=type_data.get('capacity'),
+            icon_id=type_data.get('icon_id'),
+        ))
+    
+    # 4. Insert groups and types in one transaction (one commit, and no
+    #    orphaned groups if the type insert fails). ignore_conflicts: a
+    #    concurrent refresh may have inserted the same rows already.
+    with transaction.atomic():
+        if new_groups:
+            EveGroup.objects.bulk_create(new_groups, ignore_conflicts=True)
+        if new_types:
+            EveType.objects.bulk_create(new_types, ignore_conflicts=True, batch_size=500)
+    logger.info(f"Cached {len(new_groups)} new groups and {len(new_types)} new EveTypes from ESI")
 
 # --- END NEW HELPER FUNCTION ---
 
 
+def _fetch_skills(esi, character_id, token):
+    """Fetches and validates /skills/ for a character."""
+    logger.debug(f"Fetching /skills/ for {character_id}")
+    skills_response = esi.client.Skills.get_characters_character_id_skills(
+        character_id=character_id,
+        token=token.access_token
+    ).results()
+    if 'skills' not in skills_response or 'total_sp' not in skills_response:
+        logger.error(f"Invalid skills response for {character_id}: {skills_response}")
+        raise Exception(f"Invalid skills response: {skills_response}")
+    return skills_response
+
+
+def _fetch_implants(esi, character_id, token):
+    """Fetches and validates /implants/ for a character."""
+    logger.debug(f"Fetching /implants/ for {character_id}")
+    implants_response = esi.client.Clones.get_characters_character_id_implants(
+        character_id=character_id,
+        token=token.access_token
+    ).results()
+    if not isinstance(implants_response, list):
+        logger.error(f"Invalid implants response for {character_id}: {implants_response}")
+        raise Exception(f"Invalid implants response: {implants_response}")
+    return implants_response
+
+
 @login_required
 def api_refresh_pilot(request, character_id):
     """
@@ -356,9 +470,36 @@ def api_refresh_pilot(request, character_id):
         return HttpResponseBadRequest("Invalid request method")
 
     logger.info(f"User {request.user.username} triggering ESI refresh for char {character_id} (section: {section})")
-    esi = EsiClientProvider()
+    esi = get_esi()
     character = get_object_or_404(EveCharacter, character_id=character_id, user=request.user)
+
+    sections = PILOT_REFRESH_SECTIONS if section == 'all' else (section,)
+    section_keys = [_section_refreshed_key(character_id, s) for s in sections]
+    # Repeated clicks / retries inside the TTL skip ESI entirely. The keys are
+    # only set after a successful save, so an empty snapshot is never "fresh".
+    if request.GET.get('force') != '1' and len(cache.get_many(section_keys)) == len(section_keys):
+        logger.debug(f"api_refresh_pilot: {section} for {character_id} refreshed within {PILOT_SECTION_REFRESH_TTL}s, skipping ESI")
+        return JsonResponse({"status": "success", "section": section, "cached": True})
     
+    # Single-flight: the auto-refresh and a manual click (or two tabs)
+    # must not both run the full ESI fetch for the same pilot
+    lock_key = f"pilot_refresh_lock:{character_id}"
+    if not cache.add(lock_key, True, PILOT_REFRESH_LOCK_TIMEOUT):
+        logger.info(f"api_refresh_pilot: refresh for {character_id} already running")
+        return JsonResponse({"status": "busy", "message": "A refresh for this pilot is already running."}, status=409)
+    try:
+        return _run_pilot_refresh(request, esi, character, section, sections, section_keys)
+    finally:
+        cache.delete(lock_key)
+
+
+def _run_pilot_refresh(request, esi, character, section, sections, section_keys):
+    """
+    Does the ESI fetch and save for api_refresh_pilot.
+    Called with the pilot's refresh lock held.
+    """
+    character_id = character.character_id
+
     # 1. Get and refresh token
     token = get_refreshed_token_for_character(request.user, character)
     if not token:
@@ -373,78 +514,48 @@ def api_refresh_pilot(request, character_id):
         snapshot, created = PilotSnapshot.objects.get_or_create(character=character)
         all_type_ids_to_cache = set()
 
-        # 2a. Fetch Skills
-        if section == 'all' or section == 'skills':
-            logger.debug(f"Fetching /skills/ for {character_id}")
-            skills_response = esi.client.Skills.get_characters_character_id_skills(
-                character_id=character_id,
-                token=token.access_token
-            ).results()
-            if 'skills' not in skills_response or 'total_sp' not in skills_response:
-                logger.error(f"Invalid skills response for {character_id}: {skills_response}")
-                raise Exception(f"Invalid skills response: {skills_response}")
-            
-            snapshot.skills_json = json.dumps(skills_response)
-            all_type_ids_to_cache.update(s['skill_id'] for s in skills_response.get('skills', []))
-            logger.info(f"Skills snapshot updated for {character_id}")
-
-        # 2b. Fetch Implants
-        if section == 'all' or section == 'implants':
-            logger.debug(f"Fetching /implants/ for {character_id}")
-            implants_response = esi.client.Clones.get_characters_character_id_implants(
-                character_id=character_id,
-                token=token.access_token
-            ).results()
-            if not isinstance(implants_response, list):
-                logger.error(f"Invalid implants response for {character_id}: {implants_response}")
-                raise Exception(f"Invalid implants response: {implants_response}")
-
-            snapshot.implants_json = json.dumps(implants_response)
-            all_type_ids_to_cache.update(implants_response)
-            logger.info(f"Implants snapshot updated for {character_id}")
-
-        # 2c. Fetch Public Data (Corp/Alliance)
-        if section == 'all' or section == 'public':
-            logger.debug(f"Fetching public data for {character_id}")
-            public_data = esi.client.Character.get_characters_character_id(
-                character_id=character_id
-            ).results()
-            
-            corp_id = public_data.get('corporation_id')
-            alliance_id = public_data.get('alliance_id')
-            
-            corp_name = None
-            if corp_id:
-                corp_data = esi.client.Corporation.get_corporations_corporation_id(
-                    corporation_id=corp_id
-                ).results()
-                corp_name = corp_data.get('name')
-                
-            alliance_name = None
-            if alliance_id:
-                try:
-                    alliance_data = esi.client.Alliance.get_alliances_alliance_id(
-                        alliance_id=alliance_id
-                    ).results()
-                    alliance_name = alliance_data.get('name')
-                except HTTPNotFound:
-                    logger.warning(f"Could not find alliance {alliance_id} for char {character.character_id} (dead alliance?)")
-                    alliance_name = "N/A" # Handle dead alliances
-
-            # Save corp/alliance data
-            character.corporation_id = corp_id
-            character.corporation_name = corp_name
-            character.alliance_id = alliance_id
-            character.alliance_name = alliance_name
-            character.save()
-            logger.info(f"Corp/Alliance data for {character_id} saved to DB")
-
-        # 3. Save the snapshot with any new JSON
-        snapshot.save() # This also updates 'last_updated'
-        
-        # 4. Perform SDE Caching for any new types we found
+        # 2. Skills, implants and public data are independent ESI
+        #    calls, so whichever are wanted are fetched side by side
+        fetch_skills = 'skills' in sections
+        fetch_implants = 'implants' in sections
+        fetch_public = 'public' in sections
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            skills_future = executor.submit(_fetch_skills, esi, character_id, token) if fetch_skills else None
+            implants_future = executor.submit(_fetch_implants, esi, character_id, token) if fetch_implants else None
+            public_future = executor.submit(get_character_public_data, esi, character_id) if fetch_public else None
+
+            if skills_future:
+                skills_response = skills_future.result()
+                snapshot.set_skills_data(skills_response)
+                all_type_ids_to_cache.update(s['skill_id'] for s in skills_response.get('skills', []))
+                logger.info(f"Skills snapshot updated for {character_id}")
+
+            if implants_future:
+                implants_response = implants_future.result()
+                snapshot.set_implants_data(implants_response)
+                all_type_ids_to_cache.update(implants_response)
+                logger.info(f"Implants snapshot updated for {character_id}")
+
+            if public_future:
+                public_data = public_future.result()
+                for field in PUBLIC_DATA_FIELDS:
+                    setattr(character, field, public_data[field])
+
+        # 3. Perform SDE Caching for any new types we found
+        #    (before the save, so the new snapshot version is
+        #    never grouped against a partial SDE)
         if all_type_ids_to_cache:
-            _cache_missing_eve_types(list(all_type_ids_to_cache))
+            _cache_missing_eve_types(all_type_ids_to_cache)
+        
+        # 4. Save everything we fetched together
+        with transaction.atomic():
+            if fetch_public:
+                # Only the public fields; a full save could write back
+                # token fields that another request refreshed meanwhile
+                character.save(update_fields=PUBLIC_DATA_FIELDS)
+                logger.info(f"Corp/Alliance data for {character_id} saved to DB")
+            snapshot.save() # This also updates 'last_updated'
+        cache.set_many(dict.fromkeys(section_keys, True), PILOT_SECTION_REFRESH_TTL)
         # --- END MODIFICATION ---
 
         # 5. All done, send success
@@ -457,6 +568,25 @@ def api_refresh_pilot(request, character_id):
         return JsonResponse({"status": "error", "message": str(e)}, status=500)
 
 
+def _parse_expires_header(value):
+    """
+    Parses an HTTP Expires header (RFC 1123 date) into an aware UTC
+    datetime. Accepts a plain string or a list of values; returns None
+    if the header is missing or malformed.
+    """
+    if isinstance(value, (list, tuple)):
+        value = value[0] if value else None
+    if not value:
+        return None
+    try:
+        expires_dt = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if expires_dt.tzinfo is None:
+        expires_dt = expires_dt.replace(tzinfo=dt_timezone.utc)
+    return expires_dt.astimezone(dt_timezone.utc)
+
+
 @login_required
 def api_get_implants(request):
     """
@@ -475,7 +605,7 @@ def api_get_implants(request):
         logger.warning(f"api_get_implants: User {request.user.username} tried to get implants for char {character_id} they don't own")
         return JsonResponse({"status": "error", "message": "Character not found or not yours."}, status=403)
 
-    esi = EsiClientProvider()
+    esi = get_esi()
     token = get_refreshed_token_for_character(request.user, character)
     if not token:
         logout(request)
@@ -483,7 +613,7 @@ def api_get_implants(request):
         return JsonResponse({"status": "error", "message": "Auth failed"}, status=401)
     
     # Check for correct scope
-    if 'esi-clones.read_implants.v1' not in [s.name for s in token.scopes.all()]:
+    if not token.scopes.filter(name='esi-clones.read_implants.v1').exists():
         logger.warning(f"api_get_implants: User {request.user.username} missing 'esi-clones.read_implants.v1' for {character_id}")
         return JsonResponse({"status": "error", "message": "Missing 'esi-clones.read_implants.v1' scope."}, status=403)
 
@@ -497,25 +627,12 @@ def api_get_implants(request):
         implants_response = implants_op.results()
         
         # Get Expiry header
-        # --- THIS IS THE FIX ---
-        # The .header attribute is on the *result* of the future,
+        # The headers are on the *result* of the future,
         # which is accessed via `.future.result().headers` after `.results()` is called.
-        expires_str = implants_op.future.result().headers.get('Expires', [None])[0]
-        # --- END THE FIX ---
-        
-        expires_dt = None
-        expires_iso = None
-        if expires_str:
-            try:
-                # Parse the HTTP date string
-                expires_dt = datetime.strptime(expires_str, '%a, %d %b %Y %H:%M:%S %Z').replace(tzinfo=timezone.utc)
-                expires_iso = expires_dt.isoformat()
-            except ValueError:
-                expires_dt = timezone.now() + timedelta(minutes=2) # Fallback
-                expires_iso = expires_dt.isoformat()
-        else:
+        expires_dt = _parse_expires_header(implants_op.future.result().headers.get('Expires'))
+        if expires_dt is None:
             expires_dt = timezone.now() + timedelta(minutes=2) # Fallback
-            expires_iso = expires_dt.isoformat()
+        expires_iso = expires_dt.isoformat()
         logger.debug(f"Implant cache for {character_id} expires: {expires_iso}")
 
         if not isinstance(implants_response, list):
@@ -529,13 +646,11 @@ def api_get_implants(request):
         try:
             if all_implant_ids:
                 # 1. Call the helper to cache any missing implant types
-                _cache_missing_eve_types(all_implant_ids)
+                _cache_missing_eve_types(set(all_implant_ids))
                 
                 # 2. Now, all types are guaranteed to be in our local DB.
-                #    Fetch them all in one query.
-                cached_types = {t.type_id: t for t in EveType.objects.filter(
-                    type_id__in=all_implant_ids
-                ).select_related('group')}
+                #    Fetch them all in one (cached) lookup.
+                cached_types = EveType.get_cached_bulk(all_implant_ids)
 
                 # 3. Enrich the implant list
                 for implant_id in all_implant_ids:
@@ -544,7 +659,7 @@ def api_get_implants(request):
                         enriched_implants.append({
                             'name': eve_type.name,
                             'slot': eve_type.slot if eve_type.slot else 0,
-                            'icon_url': f"https://images.evetech.net/types/{implant_id}/icon?size=32"
+                            'type_id': implant_id, # Icon URL is built from type_id in the template
                         })
                     else:
                         # This should no longer happen, but good to log if it does
@@ -557,19 +672,7 @@ def api_get_implants(request):
         
         # --- END REFACTORED SDE & GROUPING LOGIC ---
         
-        sorted_implants = sorted(enriched_implants, key=lambda i: i.get('slot', 0))
-        
-        implants_other = []
-        implants_col1 = [] # Slots 1-5
-        implants_col2 = [] # Slots 6-10
-        for implant in sorted_implants:
-            slot = implant.get('slot', 0)
-            if 0 < slot <= 5:
-                implants_col1.append(implant)
-            elif 5 < slot <= 10:
-                implants_col2.append(implant)
-            else:
-                implants_other.append(implant)
+        implants_other, implants_col1, implants_col2 = _bucket_implants(enriched_implants)
         
         context = {
             'implants_other': implants_other,
@@ -587,13 +690,11 @@ def api_get_implants(request):
                 "message": f"Template rendering failed: {str(e)}"
             }, status=500)
         
-        # Return the HTML and the expiry time
+        # Return the HTML as-is (no JSON escaping), expiry time in a header
         logger.debug(f"Successfully served implants for {character_id} (X-Up modal)")
-        return JsonResponse({
-            "status": "success",
-            "html": html,
-            "expires_iso": expires_iso
-        })
+        response = HttpResponse(html, content_type='text/html; charset=utf-8')
+        response['X-Cache-Expires'] = expires_iso
+        return response
 
     except Exception as e:
         # This catches ESI errors, token errors, etc.
@@ -4,3 +4,19 @@ from django.apps import AppConfig
 class WaitlistConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'waitlist'
+
+    def ready(self):
+        # Drop memoized URLs if the URLconf is swapped (e.g. override_settings)
+        from django.core.signals import setting_changed
+        from .url_cache import clear_url_cache
+        setting_changed.connect(clear_url_cache, dispatch_uid='waitlist_clear_url_cache')
+
+        # Forget cached Fleet Commander checks when group membership changes
+        from django.contrib.auth import get_user_model
+        from django.db.models.signals import m2m_changed
+        from .helpers import invalidate_fc_cache
+        m2m_changed.connect(
+            invalidate_fc_cache,
+            sender=get_user_model().groups.through,
+            dispatch_uid='waitlist_invalidate_fc_cache'
+        )
@@ -6,7 +6,6 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.views.decorators.http import require_POST
 from django.http import JsonResponse, HttpResponseBadRequest
 from bravado.exception import HTTPNotFound
-from esi.clients import EsiClientProvider
 # --- NEW: Import send_event ---
 from django_eventstream import send_event
 # --- END NEW ---
@@ -23,7 +22,7 @@ from .models import (
 from pilot.models import EveType, EveGroup
 # --- END NEW ---
 # Import the helper functions from our new file
-from .helpers import is_fleet_commander, get_refreshed_token_for_character, _update_fleet_structure
+from .helpers import is_fleet_commander, get_refreshed_token_for_character, _update_fleet_structure, get_header_characters, get_esi
 
 logger = logging.getLogger(__name__)
 
@@ -43,10 +42,7 @@ def fc_admin_view(request):
     
     available_fleets = Fleet.objects.filter(is_active=False).order_by('description')
 
-    all_user_chars = request.user.eve_characters.all().order_by('character_name')
-    main_char = all_user_chars.filter(is_main=True).first()
-    if not main_char:
-        main_char = all_user_chars.first()
+    all_user_chars, main_char = get_header_characters(request)
 
     context = {
         'open_waitlist': open_waitlist,
@@ -187,7 +183,8 @@ def api_fc_manage_waitlist(request):
                 'esi-fleets.read_fleet.v1',
                 'esi-fleets.write_fleet.v1'
             ]
-            available_scopes = set(s.name for s in token.scopes.all())
+            # Only fetch the names we care about, not every scope row
+            available_scopes = set(token.scopes.filter(name__in=required_scopes).values_list('name', flat=True))
             
             if not all(s in available_scopes for s in required_scopes):
                 missing = [s for s in required_scopes if s not in available_scopes]
@@ -198,7 +195,7 @@ def api_fc_manage_waitlist(request):
                 }, status=403)
 
             # 3. Initialize ESI client
-            esi = EsiClientProvider()
+            esi = get_esi()
             new_esi_fleet_id = None
             
             # 4. Make ESI call to get fleet info
@@ -331,7 +328,7 @@ def api_get_fleet_members(request):
         # 1. Get FC token and ESI client
         fc_character = fleet.fleet_commander
         token = get_refreshed_token_for_character(request.user, fc_character)
-        esi = EsiClientProvider()
+        esi = get_esi()
         fleet_id = fleet.esi_fleet_id
         
         # 2. Get ESI fleet member list
@@ -603,7 +600,7 @@ def api_save_squad_mappings(request):
         # 1. Get FC token and ESI client
         fc_character = fleet.fleet_commander
         token = get_refreshed_token_for_character(request.user, fc_character)
-        esi = EsiClientProvider()
+        esi = get_esi()
         
         # 2. Parse incoming data
         data = json.loads(request.body)
@@ -785,7 +782,7 @@ def api_fc_invite_pilot(request):
         
         # 5. Send the invite
         logger.debug(f"Sending ESI invite to {pilot_to_invite.character_name}: {invitation}")
-        esi = EsiClientProvider()
+        esi = get_esi()
         esi.client.Fleets.post_fleets_fleet_id_members(
             fleet_id=fleet.esi_fleet_id,
             invitation=invitation,
@@ -869,7 +866,7 @@ def api_fc_create_default_layout(request):
         # 2. Get FC character and token
         fc_character = fleet.fleet_commander
         token = get_refreshed_token_for_character(request.user, fc_character)
-        esi = EsiClientProvider()
+        esi = get_esi()
         fleet_id = fleet.esi_fleet_id
         
         # 3. Check FC Position
@@ -1090,7 +1087,7 @@ def api_fc_refresh_structure(request):
         # 1. Get FC token and ESI client
         fc_character = fleet.fleet_commander
         token = get_refreshed_token_for_character(request.user, fc_character)
-        esi = EsiClientProvider()
+        esi = get_esi()
         
         # 2. Call the helper to update the DB
         _update_fleet_structure(
@@ -1193,7 +1190,7 @@ def api_fc_add_squad(request):
     try:
         fc_character = fleet.fleet_commander
         token = get_refreshed_token_for_character(request.user, fc_character)
-        esi = EsiClientProvider()
+        esi = get_esi()
         
         new_squad = esi.client.Fleets.post_fleets_fleet_id_wings_wing_id_squads(
             fleet_id=fleet.esi_fleet_id,
@@ -1243,7 +1240,7 @@ def api_fc_delete_squad(request):
     try:
         fc_character = fleet.fleet_commander
         token = get_refreshed_token_for_character(request.user, fc_character)
-        esi = EsiClientProvider()
+        esi = get_esi()
         
         esi.client.Fleets.delete_fleets_fleet_id_squads_squad_id(
             fleet_id=fleet.esi_fleet_id,
@@ -1279,7 +1276,7 @@ def api_fc_add_wing(request):
     try:
         fc_character = fleet.fleet_commander
         token = get_refreshed_token_for_character(request.user, fc_character)
-        esi = EsiClientProvider()
+        esi = get_esi()
         
         new_wing = esi.client.Fleets.post_fleets_fleet_id_wings(
             fleet_id=fleet.esi_fleet_id,
@@ -1328,7 +1325,7 @@ def api_fc_delete_wing(request):
     try:
         fc_character = fleet.fleet_commander
         token = get_refreshed_token_for_character(request.user, fc_character)
-        esi = EsiClientProvider()
+        esi = get_esi()
         
         esi.client.Fleets.delete_fleets_fleet_id_wings_wing_id(
             fleet_id=fleet.esi_fleet_id,
@@ -1358,10 +1355,7 @@ def fc_rule_helper_view(request):
     logger.debug(f"FC {request.user.username} accessing rule helper shell")
 
     # --- Context for base.html ---
-    all_user_chars = request.user.eve_characters.all().order_by('character_name')
-    main_char = all_user_chars.filter(is_main=True).first()
-    if not main_char:
-        main_char = all_user_chars.first()
+    all_user_chars, main_char = get_header_characters(request)
 
     context = {
         'is_fc': True,
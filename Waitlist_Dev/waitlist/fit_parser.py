@@ -16,6 +16,27 @@ from django.db import models
 # Get a logger for this specific Python file
 logger = logging.getLogger(__name__)
 
+# EFT patterns, compiled once at import
+_HEADER_RE = re.compile(r'^\[([^,]+),\s*(.*?)\]$') # [Ship, Fit Name]
+_TAG_RE = re.compile(r'<[^>]+>') # Markup in pasted ship names
+_ITEM_RE = re.compile(r'^(.*?)(?: x(\d+))?$') # Item name with optional " xN"
+
+def _get_types_by_name(names):
+    """
+    Looks up EveTypes (with their group) for a set of names in one query.
+    Returns {lowercased name: EveType}; unknown names are left out.
+    """
+    types_by_name = {t.name.lower(): t for t in EveType.objects.filter(name__in=names).select_related('group')}
+    # name__in is only case-insensitive on a case-insensitive collation
+    # (MySQL's default), so retry any leftovers one by one with iexact
+    for name in names:
+        if name.lower() not in types_by_name:
+            item_type = EveType.objects.filter(name__iexact=name).select_related('group').first()
+            if item_type is not None:
+                types_by_name[name.lower()] = item_type
+    return types_by_name
+
+
 # New parser logic based on EFT block order
 def parse_eft_fit(raw_fit_original: str):
     """
@@ -47,7 +68,7 @@ def parse_eft_fit(raw_fit_original: str):
         raise ValueError("Fit contains only whitespace.")
 
     # 2. Manually parse the header
-    header_match = re.match(r'^\[([^,]+),\s*(.*?)\]$', header_line)
+    header_match = _HEADER_RE.match(header_line)
     if not header_match:
         logger.warning(f"Fit parsing failed: Invalid header: {header_line}")
         raise ValueError("Could not find valid header. Fit must start with [Ship, Fit Name].")
@@ -57,13 +78,23 @@ def parse_eft_fit(raw_fit_original: str):
         logger.warning(f"Fit parsing failed: Ship name in header is empty: {header_line}")
         raise ValueError("Ship name in header is empty.")
 
-    tag_stripper = re.compile(r'<[^>]+>')
-    ship_name = tag_stripper.sub('', ship_name_raw).strip()
+    ship_name = _TAG_RE.sub('', ship_name_raw).strip()
 
-    # 3. Get the Type ID for the ship (from our SDE)
-    try:
-        ship_type = EveType.objects.select_related('group').get(name__iexact=ship_name)
-    except EveType.DoesNotExist:
+    # 3. Resolve the hull and every item name in the fit up front,
+    #    in one query, instead of one SDE lookup per line below
+    item_names = {ship_name}
+    for line in lines_raw[first_line_index + 1:]:
+        stripped_line = line.strip()
+        if not stripped_line or (stripped_line.startswith('[') and stripped_line.endswith(']')):
+            continue
+        match = _ITEM_RE.match(stripped_line)
+        if match and match.group(1).strip():
+            item_names.add(match.group(1).strip())
+    types_by_name = _get_types_by_name(item_names)
+
+    # Get the Type ID for the ship (from our SDE)
+    ship_type = types_by_name.get(ship_name.lower())
+    if ship_type is None:
         logger.warning(f"Fit parsing failed: Ship hull '{ship_name}' not found in SDE")
         raise ValueError(f"Ship hull '{ship_name}' could not be found in local SDE. Is SDE imported?")
     
@@ -72,8 +103,6 @@ def parse_eft_fit(raw_fit_original: str):
     # 4. --- NEW: Detect Fit Order ---
     # We peek at the first *actual item* after the header to decide
     # which slot order to use.
-    
-    item_regex = re.compile(r'^(.*?)(?: x(\d+))?$')
     first_slot_type = None
     
     for line in lines_raw[first_line_index + 1:]:
@@ -84,7 +113,7 @@ def parse_eft_fit(raw_fit_original: str):
         if stripped_line.startswith('[') and stripped_line.endswith(']'):
             continue # Skip empty slots
             
-        match = item_regex.match(stripped_line)
+        match = _ITEM_RE.match(stripped_line)
         if not match:
             continue # Skip unmatchable lines
             
@@ -93,14 +122,13 @@ def parse_eft_fit(raw_fit_original: str):
             continue # Skip lines that parse to an empty name
 
         # Found the first item, check its type
-        try:
-            first_item_type = EveType.objects.get(name__iexact=item_name)
-            first_slot_type = first_item_type.slot_type
-            logger.debug(f"First item found: '{item_name}', slot_type: '{first_slot_type}'.")
-            break # We have our answer
-        except EveType.DoesNotExist:
+        first_item_type = types_by_name.get(item_name.lower())
+        if first_item_type is None:
              logger.warning(f"Fit parsing failed: Unknown item '{item_name}'")
              raise ValueError(f"Unknown item in fit: '{item_name}'. Is SDE imported?")
+        first_slot_type = first_item_type.slot_type
+        logger.debug(f"First item found: '{item_name}', slot_type: '{first_slot_type}'.")
+        break # We have our answer
     
     # This defines the order of fittable sections in an EFT block
     EFT_SECTION_ORDER = []
@@ -185,7 +213,7 @@ def parse_eft_fit(raw_fit_original: str):
             continue
 
         # This is an item
-        match = item_regex.match(stripped_line)
+        match = _ITEM_RE.match(stripped_line)
         if not match:
             logger.warning(f"Fit parsing: Could not parse line: '{stripped_line}'")
             parsed_fit_list.append({
@@ -200,10 +228,9 @@ def parse_eft_fit(raw_fit_original: str):
         if not item_name:
             continue
 
-        # Get item from our SDE
-        try:
-            item_type = EveType.objects.get(name__iexact=item_name)
-        except EveType.DoesNotExist:
+        # Get item from our SDE (already loaded above)
+        item_type = types_by_name.get(item_name.lower())
+        if item_type is None:
              logger.warning(f"Fit parsing failed: Unknown item '{item_name}'")
              raise ValueError(f"Unknown item in fit: '{item_name}'. Is SDE imported?")
         
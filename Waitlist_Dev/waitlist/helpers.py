@@ -1,5 +1,9 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from django.utils import timezone
+from django.core.cache import cache
+from django.db import transaction
+from datetime import timedelta
 import requests
 from esi.models import Token
 from esi.clients import EsiClientProvider
@@ -8,11 +12,164 @@ from .models import FleetWing, FleetSquad, EveCharacter, Fleet
 
 logger = logging.getLogger(__name__)
 
+# Max parallel ESI requests when caching SDE data
+ESI_FETCH_WORKERS = 10
+
+# --- Shared ESI client ---
+# Building an EsiClientProvider loads the swagger spec and a fresh
+# HTTP session, so build it once per process (on first use, not at import)
+_esi_provider = None
+
+
+def get_esi():
+    """Returns the process-wide EsiClientProvider, creating it on first call."""
+    global _esi_provider
+    if _esi_provider is None:
+        # Pool size and retries come from django-esi's own settings
+        # (ESI_CONNECTION_POOL_MAXSIZE etc. in settings.py)
+        _esi_provider = EsiClientProvider()
+    return _esi_provider
+
+
+# EveCharacter fields filled from get_character_public_data()
+PUBLIC_DATA_FIELDS = ('corporation_id', 'corporation_name', 'alliance_id', 'alliance_name')
+
+# Corp and alliance names are looked up side by side on this pool
+_public_data_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='esi-public')
+
+
+# Corp/alliance names almost never change and many pilots share them,
+# so they are cached by ID. Affiliation itself (the character call) is
+# not cached, so a refresh still picks up corp changes right away.
+ORG_NAME_CACHE_TTL = 6 * 60 * 60
+
+
+def _fetch_corporation_name(esi, corp_id):
+    return esi.client.Corporation.get_corporations_corporation_id(
+        corporation_id=corp_id
+    ).results().get('name')
+
+
+def _fetch_alliance_name(esi, alliance_id, character_id):
+    try:
+        return esi.client.Alliance.get_alliances_alliance_id(
+            alliance_id=alliance_id
+        ).results().get('name')
+    except HTTPNotFound:
+        logger.warning(f"Could not find alliance {alliance_id} for char {character_id} (dead alliance?)")
+        return "N/A" # Handle dead alliances
+
+
+def _get_corporation_name(esi, corp_id):
+    return cache.get_or_set(
+        f"esi:corp_name:{corp_id}",
+        lambda: _fetch_corporation_name(esi, corp_id),
+        ORG_NAME_CACHE_TTL
+    )
+
+
+def _get_alliance_name(esi, alliance_id, character_id):
+    return cache.get_or_set(
+        f"esi:alliance_name:{alliance_id}",
+        lambda: _fetch_alliance_name(esi, alliance_id, character_id),
+        ORG_NAME_CACHE_TTL
+    )
+
+
+def get_character_public_data(esi, character_id):
+    """
+    Fetches a character's corporation/alliance IDs and names.
+    Returns a dict keyed by PUBLIC_DATA_FIELDS.
+    The corp and alliance lookups only need the character's
+    IDs, so they run concurrently after the character call.
+    """
+    logger.debug(f"Fetching public data for {character_id}")
+    public_data = esi.client.Character.get_characters_character_id(
+        character_id=character_id
+    ).results()
+    
+    corp_id = public_data.get('corporation_id')
+    alliance_id = public_data.get('alliance_id')
+
+    corp_future = _public_data_executor.submit(_get_corporation_name, esi, corp_id) if corp_id else None
+    alliance_future = _public_data_executor.submit(_get_alliance_name, esi, alliance_id, character_id) if alliance_id else None
+
+    return {
+        'corporation_id': corp_id,
+        'corporation_name': corp_future.result() if corp_future else None,
+        'alliance_id': alliance_id,
+        'alliance_name': alliance_future.result() if alliance_future else None,
+    }
+
+
+# Refresh tokens this long before they expire, so a token can't
+# run out between the check and the ESI call that uses it
+TOKEN_REFRESH_MARGIN = timedelta(seconds=60)
+
+
+FC_GROUP_NAME = 'Fleet Commander'
+FC_CACHE_TTL = 60
+
+
+def _fc_cache_key(user_id):
+    return f"is_fc:{user_id}"
+
+
 def is_fleet_commander(user):
     """
     Checks if a user is in the 'Fleet Commander' group.
+    The result is kept on the user object for the rest of the request
+    and in the cache for FC_CACHE_TTL seconds. Group changes clear it
+    (see invalidate_fc_cache).
+    """
+    if not user.is_authenticated:
+        return False
+    try:
+        return user._is_fc
+    except AttributeError:
+        pass
+    user._is_fc = cache.get_or_set(
+        _fc_cache_key(user.id),
+        lambda: user.groups.filter(name=FC_GROUP_NAME).exists(),
+        FC_CACHE_TTL
+    )
+    return user._is_fc
+
+
+def invalidate_fc_cache(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    'm2m_changed' receiver for User.groups, so promotions and
+    demotions take effect on the next request.
+    """
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        # user.groups.add/remove/clear(...)
+        user_ids = [instance.pk]
+    elif pk_set is not None:
+        # group.user_set.add/remove(...)
+        user_ids = pk_set
+    else:
+        # group.user_set.clear(): look up members before they're removed
+        user_ids = list(instance.user_set.values_list('pk', flat=True))
+    cache.delete_many([_fc_cache_key(uid) for uid in user_ids])
+
+
+def get_header_characters(request):
+    """
+    Returns (all characters by name, main character) for the current
+    user, for the base.html header and X-Up modal.
+    One query, memoized on the request so repeat calls are free.
     """
-    return user.groups.filter(name='Fleet Commander').exists()
+    try:
+        return request._header_characters
+    except AttributeError:
+        pass
+    all_user_chars = list(request.user.eve_characters.all().order_by('character_name'))
+    # Fall back to the first character if none is marked as main
+    main_char = next((c for c in all_user_chars if c.is_main), all_user_chars[0] if all_user_chars else None)
+    request._header_characters = (all_user_chars, main_char)
+    return request._header_characters
 
 
 def get_refreshed_token_for_character(user, character: EveCharacter):
@@ -25,20 +182,16 @@ def get_refreshed_token_for_character(user, character: EveCharacter):
         token = Token.objects.filter(
             user=user, 
             character_id=character.character_id
-        ).order_by('-created').first()
-        
-        if not token:
-            logger.warning(f"No ESI token found for character {character.character_id}")
-            raise Token.DoesNotExist
+        ).latest('created') # Raises Token.DoesNotExist if there is none
 
         # Handle token_expiry being None (e.g., on first login)
-        if not character.token_expiry or character.token_expiry < timezone.now():
+        if not character.token_expiry or character.token_expiry < timezone.now() + TOKEN_REFRESH_MARGIN:
             logger.info(f"Refreshing ESI token for {character.character_name} ({character.character_id})")
             token.refresh()
             character.access_token = token.access_token
             # .expires is an in-memory attribute added by .refresh()
             character.token_expiry = token.expires 
-            character.save()
+            character.save(update_fields=['access_token', 'token_expiry'])
             logger.info(f"Token refreshed successfully for {character.character_name}")
             
         return token
@@ -79,33 +232,34 @@ def _update_fleet_structure(esi: EsiClientProvider, fc_character: EveCharacter,
         raise
     
     # 2. Get all *existing* category mappings from the DB before clearing
-    existing_mappings = {
-        s.squad_id: s.assigned_category
-        for s in FleetSquad.objects.filter(wing__fleet=fleet_obj)
-        if s.assigned_category is not None
-    }
+    existing_mappings = dict(
+        FleetSquad.objects.filter(wing__fleet=fleet_obj, assigned_category__isnull=False)
+        .values_list('squad_id', 'assigned_category')
+    )
     logger.debug(f"Preserved {len(existing_mappings)} existing squad mappings")
 
-    # 3. Clear old structure
-    FleetWing.objects.filter(fleet=fleet_obj).delete() # This cascades and deletes squads
-    
-    # 4. Create new wings
-    for wing in wings:
-        new_wing = FleetWing.objects.create(
-            fleet=fleet_obj,
-            wing_id=wing['id'],
-            name=wing['name']
-        )
+    with transaction.atomic():
+        # 3. Clear old structure
+        FleetWing.objects.filter(fleet=fleet_obj).delete() # This cascades and deletes squads
         
-        # 5. Create new squads
-        for squad in wing['squads']:
-            # Restore category if this squad_id existed before
-            restored_category = existing_mappings.get(squad['id'])
-            
-            FleetSquad.objects.create(
-                wing=new_wing,
+        # 4. Create new wings in one INSERT
+        FleetWing.objects.bulk_create([
+            FleetWing(fleet=fleet_obj, wing_id=wing['id'], name=wing['name'])
+            for wing in wings
+        ])
+        # MySQL doesn't return primary keys from bulk_create, so read them back
+        wing_pks = dict(FleetWing.objects.filter(fleet=fleet_obj).values_list('wing_id', 'pk'))
+        
+        # 5. Create new squads in one INSERT
+        FleetSquad.objects.bulk_create([
+            FleetSquad(
+                wing_id=wing_pks[wing['id']],
                 squad_id=squad['id'],
                 name=squad['name'], # Use the name from ESI
-                assigned_category=restored_category # Restore the mapping
+                # Restore category if this squad_id existed before
+                assigned_category=existing_mappings.get(squad['id'])
             )
+            for wing in wings
+            for squad in wing['squads']
+        ])
     logger.info(f"Fleet structure update complete for fleet {fleet_id}")
\ No newline at end of file
@@ -5,6 +5,7 @@ import time
 from django.core.management.base import BaseCommand
 from django.db import transaction, connection
 from pilot.models import EveCategory, EveGroup, EveType
+from pilot.apps import evetype_cache_signals_muted
 from waitlist.models import EveDogmaAttribute, EveTypeDogmaAttribute
 
 # ---
@@ -63,7 +64,12 @@ class Command(BaseCommand):
         logger.info("--- Starting SDE Import ---")
         
         try:
-            with transaction.atomic():
+            # Bulk deletes/inserts below don't need per-row cache signals;
+            # the EveType cache is cleared once the import commits. Running
+            # web workers see that within a minute with a shared CACHES
+            # backend, otherwise within two hours (see EveType._LOCAL_CACHE_TTL).
+            with evetype_cache_signals_muted(), transaction.atomic():
+                transaction.on_commit(EveType.clear_cache)
                 
                 # 1. Eve Categories
                 self.import_categories()
@@ -16,7 +16,18 @@ logger = logging.getLogger(__name__)
 # ---
 
 class Command(BaseCommand):
-    help = 'Refreshes ESI tokens that have not been used in 7 days.'
+    help = ('Refreshes ESI tokens that have not been used in 7 days, or with '
+            '--expiring-within, still-valid tokens that are about to expire.')
+
+    def add_arguments(self, parser):
+        # Run from cron with e.g. --expiring-within 10 every 5 minutes
+        # so page views rarely have to refresh a token themselves
+        parser.add_argument(
+            '--expiring-within',
+            type=int,
+            metavar='MINUTES',
+            help='Instead of stale tokens, refresh still-valid tokens that expire within MINUTES.'
+        )
 
     def handle(self, *args, **options):
         # --- NEW: Use logger instead of stdout ---
@@ -28,10 +39,18 @@ class Command(BaseCommand):
         
         # 1. Define the cutoff date
         # --- FIX: We query our EveCharacter model, not the Token model ---
-        cutoff_date = timezone.now() - timedelta(days=7)
-        
-        # 2. Find all EveCharacters with stale tokens
-        stale_characters = EveCharacter.objects.filter(token_expiry__lt=cutoff_date)
+        now = timezone.now()
+        if options['expiring_within'] is not None:
+            # Only tokens that are still valid; already-expired ones belong
+            # to dormant characters and are left to the 7-day sweep
+            cutoff_date = now + timedelta(minutes=options['expiring_within'])
+            stale_characters = EveCharacter.objects.filter(
+                token_expiry__gte=now, token_expiry__lt=cutoff_date
+            )
+        else:
+            cutoff_date = now - timedelta(days=7)
+            # 2. Find all EveCharacters with stale tokens
+            stale_characters = EveCharacter.objects.filter(token_expiry__lt=cutoff_date)
         # --- END FIX ---
         
         total_tokens = stale_characters.count()
@@ -65,7 +84,7 @@ class Command(BaseCommand):
                 # token.expires is an in-memory attribute added by .refresh()
                 eve_char.access_token = token.access_token
                 eve_char.token_expiry = token.expires 
-                eve_char.save()
+                eve_char.save(update_fields=['access_token', 'token_expiry'])
                     
                 # --- NEW: Use logger ---
                 logger.info(f"Successfully refreshed token for {eve_char.character_name}.")
@@ -0,0 +1,17 @@
+# Generated by Django 5.0 on 2026-10-15 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('waitlist', '0015_alter_itemcomparisonrule_unique_together_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shipfit',
+            index=models.Index(fields=['waitlist', 'status', '-submitted_at'], name='shipfit_wl_status_sub_idx'),
+        ),
+    ]
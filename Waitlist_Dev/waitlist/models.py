@@ -184,6 +184,14 @@ class ShipFit(models.Model):
     hull_fleet_hours = models.IntegerField(default=0)
     # --- END NEW FIELDS ---
 
+    class Meta:
+        # Covers "fits in this waitlist with this status, newest first"
+        # (waitlist view, admin list, approved counts) without a filesort.
+        # 'status' alone is already indexed via db_index.
+        indexes = [
+            models.Index(fields=['waitlist', 'status', '-submitted_at'], name='shipfit_wl_status_sub_idx'),
+        ]
+
     def __str__(self):
         return f"{self.character.character_name} - {self.ship_name} ({self.status})"
 
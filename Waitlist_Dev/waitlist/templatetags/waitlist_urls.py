@@ -0,0 +1,13 @@
+from django import template
+from waitlist.url_cache import cached_reverse
+
+register = template.Library()
+
+
+@register.simple_tag
+def curl(viewname, *args, **kwargs):
+    """
+    Cached version of the {% url %} tag.
+    Usage: {% curl 'pilot:pilot_detail' character.character_id %}
+    """
+    return cached_reverse(viewname, args=args, kwargs=kwargs)
@@ -0,0 +1,42 @@
+import functools
+from django.urls import reverse, get_script_prefix
+
+
+@functools.lru_cache(maxsize=4096)
+def _cached_reverse(viewname, args, kwargs, current_app, script_prefix):
+    # script_prefix is only part of the key, reverse() reads it itself
+    return reverse(
+        viewname,
+        args=args or None,
+        kwargs=dict(kwargs) if kwargs else None,
+        current_app=current_app,
+    )
+
+
+def cached_reverse(viewname, args=None, kwargs=None, current_app=None):
+    """
+    Memoized drop-in for django.urls.reverse().
+    Our URL patterns never change at runtime, so the same
+    (viewname, args, kwargs) always resolves to the same path.
+    The script prefix is part of the key so sub-path deployments stay correct.
+    """
+    return _cached_reverse(
+        viewname,
+        tuple(args or ()),
+        frozenset((kwargs or {}).items()),
+        current_app,
+        get_script_prefix(),
+    )
+
+
+cached_reverse.cache_clear = _cached_reverse.cache_clear
+cached_reverse.cache_info = _cached_reverse.cache_info
+
+
+def clear_url_cache(*, setting, **kwargs):
+    """
+    'setting_changed' receiver. Mirrors Django's own
+    clear_url_caches() handler for ROOT_URLCONF.
+    """
+    if setting == 'ROOT_URLCONF':
+        cached_reverse.cache_clear()
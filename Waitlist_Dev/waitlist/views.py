@@ -11,7 +11,7 @@ from django_eventstream import send_event
 from .models import EveCharacter, ShipFit, FleetWaitlist, DoctrineFit
 from pilot.models import EveType
 from .fit_parser import parse_eft_fit, check_fit_against_doctrines
-from .helpers import is_fleet_commander  # Import from new helper file
+from .helpers import is_fleet_commander, get_header_characters  # Import from new helper file
 
 # Get a logger for this specific Python file
 logger = logging.getLogger(__name__)
@@ -59,10 +59,7 @@ def home(request):
     is_fc = is_fleet_commander(request.user) # Use helper
     
     # Get character info for header and modals
-    all_user_chars = request.user.eve_characters.all().order_by('character_name')
-    main_char = all_user_chars.filter(is_main=True).first()
-    if not main_char:
-        main_char = all_user_chars.first()
+    all_user_chars, main_char = get_header_characters(request)
     
     context = {
         'xup_fits': xup_fits,
@@ -116,10 +113,7 @@ def fittings_view(request):
     # 5. Get context variables needed by base.html
     is_fc = is_fleet_commander(request.user) # Use helper
     
-    all_user_chars = request.user.eve_characters.all().order_by('character_name')
-    main_char = all_user_chars.filter(is_main=True).first()
-    if not main_char:
-        main_char = all_user_chars.first()
+    all_user_chars, main_char = get_header_characters(request)
     
     context = {
         'grouped_fits': grouped_fits,